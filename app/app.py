@@ -7,9 +7,10 @@ from datetime import datetime
 from contextlib import asynccontextmanager
 from typing import Optional, List, Any
 
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, Response
+from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from opentelemetry import trace
@@ -23,16 +24,20 @@ from opentelemetry.instrumentation.requests import RequestsInstrumentor
 from kafka_producer import get_producer
 from kafka_consumer import get_consumer
 from kafka_config import log_kafka_config
-from database import init_db
+from database import init_db, close_pool
+from health import get_prober, UP, DOWN, UNKNOWN
+from export import TABLES as EXPORT_TABLES, open_csv_gzip
+from rate_limit import get_rate_limiters, client_key
+from logging_config import setup_logging
 
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (queued; formatted and written by a background thread,
+# flushed and stopped by an atexit hook after uvicorn has finished logging)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+EXPORT_ENDPOINT_ENABLED = os.getenv('EXPORT_ENDPOINT_ENABLED', 'false').lower() == 'true'
+
 # Global state
 hostname = socket.gethostname()
 host_os = platform.system()
@@ -40,6 +45,7 @@ pod_ip: Optional[str] = None
 kafka_producer = None
 kafka_consumer = None
 tracer = None
+health_prober = None
 REQUEST_COUNT = None
 REQUEST_DURATION = None
 
@@ -136,10 +142,28 @@ def init_kafka() -> tuple:
         return None, None
 
 
+def init_health_prober(kafka_enabled: bool, otlp_enabled: bool) -> Optional[Any]:
+    """Start background dependency probes with graceful degradation"""
+    try:
+        prober = get_prober(kafka_enabled=kafka_enabled, otlp_enabled=otlp_enabled)
+        prober.start()
+        return prober
+    except Exception as e:
+        logger.warning(f"Health prober initialization failed: {str(e)}")
+        return None
+
+
+def dependency_status(name: str) -> str:
+    """Last probed status of a dependency (never probes inline)"""
+    if not health_prober:
+        return UNKNOWN
+    return health_prober.status(name)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
-    global kafka_producer, kafka_consumer, tracer, REQUEST_COUNT, REQUEST_DURATION, pod_ip
+    global kafka_producer, kafka_consumer, tracer, health_prober, REQUEST_COUNT, REQUEST_DURATION, pod_ip
     
     # Startup
     logger.info("Starting Simple Time Service...")
@@ -164,10 +188,18 @@ async def lifespan(app: FastAPI):
     # Initialize Kafka
     kafka_producer, kafka_consumer = init_kafka()
     
+    # Start background dependency probes
+    health_prober = init_health_prober(
+        kafka_enabled=kafka_producer is not None,
+        otlp_enabled=tracer is not None
+    )
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Simple Time Service...")
+    if health_prober:
+        health_prober.stop()
     try:
         if kafka_consumer:
             kafka_consumer.stop()
@@ -176,6 +208,7 @@ async def lifespan(app: FastAPI):
             kafka_producer.close()
     except Exception as e:
         logger.error(f"Error during Kafka cleanup: {str(e)}")
+    close_pool()
     
     logger.info("Shutdown complete")
 
@@ -203,6 +236,34 @@ def get_proxy_chain(request: Request) -> List[str]:
     return []
 
 
+def rate_limited(route: str, method: str = 'GET'):
+    """Dependency rejecting clients over the route's token-bucket limit with 429.
+
+    Runs before the handler body, so throttled requests never reach Kafka
+    emission or template rendering.
+    """
+    limiter = rate_limiters.get(route)
+
+    async def check(request: Request):
+        if not limiter:
+            return
+        peer = request.client.host if request.client else None
+        wait = limiter.acquire(client_key(request.headers.getlist("X-Forwarded-For"), peer))
+        if wait:
+            if REQUEST_COUNT:
+                REQUEST_COUNT.labels(method=method, endpoint=route, status='429').inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, int(wait + 0.999)))}
+            )
+
+    return check
+
+
+# Per-route, per-client rate limits
+rate_limiters = get_rate_limiters()
+
 # Create FastAPI app
 app = FastAPI(
     title="Simple Time Service",
@@ -231,6 +292,22 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/readyz", tags=["Health"])
+async def readiness_check():
+    """Readiness endpoint backed by the cached dependency probe snapshot"""
+    ready = health_prober.is_ready() if health_prober else False
+    status = '200' if ready else '503'
+    if REQUEST_COUNT:
+        REQUEST_COUNT.labels(method='GET', endpoint='/readyz', status=status).inc()
+    return JSONResponse(
+        content={
+            "status": "ready" if ready else "not ready",
+            "dependencies": health_prober.snapshot if health_prober else {}
+        },
+        status_code=int(status)
+    )
+
+
 @app.get("/metrics", tags=["Monitoring"])
 async def metrics():
     """Prometheus metrics endpoint"""
@@ -243,7 +320,7 @@ async def metrics():
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
-@app.post("/kafka/publish", tags=["Kafka"])
+@app.post("/kafka/publish", tags=["Kafka"], dependencies=[Depends(rate_limited('/kafka/publish', 'POST'))])
 async def kafka_publish(request: Request):
     """Publish a custom event to Kafka"""
     if not kafka_producer:
@@ -302,8 +379,14 @@ async def kafka_status():
         return {
             "kafka_producer": producer_status,
             "kafka_consumer": consumer_status,
+            "kafka_broker": dependency_status('kafka'),
             "consumer_topics": kafka_consumer.topics,
-            "consumer_handlers": list(kafka_consumer.message_handlers.keys())
+            "consumer_group": kafka_consumer.group_id,
+            "consumer_event_types": kafka_consumer.event_types or "all",
+            "consumer_handlers": sorted({*kafka_consumer.message_handlers, *kafka_consumer.batch_handlers}),
+            "consumer_invalid_messages": kafka_consumer.invalid_messages,
+            "consumer_duplicate_messages": kafka_consumer.duplicate_messages,
+            "consumer_dedup_filter_bytes": kafka_consumer.seen_event_ids.size_bytes
         }
     except Exception as e:
         logger.error(f"Error getting Kafka status: {str(e)}", exc_info=True)
@@ -329,7 +412,35 @@ async def kafka_flush():
             REQUEST_COUNT.labels(method='POST', endpoint='/kafka/flush', status='500').inc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/", tags=["Time Service"])
+@app.get("/export/{table}", tags=["Export"])
+async def export_table(table: str, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Stream a gzip-compressed CSV export of an event table"""
+    if not EXPORT_ENDPOINT_ENABLED:
+        raise HTTPException(status_code=404, detail="Export endpoint disabled")
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    
+    start = start or datetime(1970, 1, 1)
+    end = end or datetime.utcnow()
+    try:
+        # Connect and run the first query before any headers go out
+        body = await run_in_threadpool(open_csv_gzip, table, start, end)
+    except Exception as e:
+        logger.error(f"Export of {table} failed: {str(e)}")
+        if REQUEST_COUNT:
+            REQUEST_COUNT.labels(method='GET', endpoint='/export', status='503').inc()
+        raise HTTPException(status_code=503, detail="Database not available")
+    if REQUEST_COUNT:
+        REQUEST_COUNT.labels(method='GET', endpoint='/export', status='200').inc()
+    
+    filename = f"{table}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.csv.gz"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/", tags=["Time Service"], dependencies=[Depends(rate_limited('/'))])
 async def get_time_and_ip(request: Request):
     """Main endpoint - returns current time and request information"""
     try:
@@ -351,17 +462,17 @@ async def get_time_and_ip(request: Request):
                     os=host_os
                 )
             except Exception as e:
-                logger.warning(f"Failed to send Kafka request event: {str(e)}")
+                logger.warning("Failed to send Kafka request event: %s", e)
         
         # Build dependency status
         deps_status = {
-            "kafka": "up" if kafka_producer else "down",
-            "opentelemetry": "up" if tracer else "down",
-            "prometheus": "up" if (REQUEST_COUNT and REQUEST_DURATION) else "down",
-            "postgres": "up"
+            "kafka": dependency_status('kafka') if kafka_producer else DOWN,
+            "opentelemetry": dependency_status('opentelemetry') if tracer else DOWN,
+            "prometheus": UP if (REQUEST_COUNT and REQUEST_DURATION) else DOWN,
+            "postgres": dependency_status('postgres')
         }
         
-        running_services = sum(1 for status in deps_status.values() if status == "up")
+        running_services = sum(1 for status in deps_status.values() if status == UP)
         total_services = len(deps_status)
         
         response_data = {
@@ -380,7 +491,7 @@ async def get_time_and_ip(request: Request):
             span.set_attribute("user_ip", user_ip)
             span.set_attribute("has_proxy_chain", len(proxy_chain) > 0)
         
-        logger.info(f"Request from {user_ip}", extra={"user_ip": user_ip, "proxy_chain": proxy_chain})
+        logger.info("Request from %s", user_ip, extra={"user_ip": user_ip, "proxy_chain": proxy_chain})
         
         # Send response event to Kafka (if available)
         if kafka_producer:
@@ -391,7 +502,7 @@ async def get_time_and_ip(request: Request):
                     response_time_ms=0
                 )
             except Exception as e:
-                logger.warning(f"Failed to send Kafka response event: {str(e)}")
+                logger.warning("Failed to send Kafka response event: %s", e)
         
         if REQUEST_COUNT:
             REQUEST_COUNT.labels(method='GET', endpoint='/', status='200').inc()
@@ -431,7 +542,7 @@ async def get_time_and_ip(request: Request):
                     endpoint='/'
                 )
             except Exception as kafka_error:
-                logger.warning(f"Failed to send Kafka error event: {str(kafka_error)}")
+                logger.warning("Failed to send Kafka error event: %s", kafka_error)
         
         if REQUEST_COUNT:
             REQUEST_COUNT.labels(method='GET', endpoint='/', status='500').inc()
@@ -443,5 +554,6 @@ if __name__ == "__main__":
         "app:app",
         host="0.0.0.0",
         port=8080,
+        log_config=None,  # let uvicorn loggers propagate to the queued root handler
         reload=os.getenv("RELOAD", "false").lower() == "true"
     )
@@ -1,65 +1,151 @@
 """Database module for storing events using PostgreSQL"""
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import os
 import logging
 import json
+import threading
 from datetime import datetime
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 # Secrets Manager configuration
 SECRET_NAME = 'rds!db-d3383bf3-468c-4942-86f3-89af40e59872'
 REGION_NAME = 'us-east-1'
+RDS_HOST = 'simple-time-service-postgres.co18eum88817.us-east-1.rds.amazonaws.com'
+DATABASE_NAME = 'simple_time_service'
+# Connection pool sizing
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '5'))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+
+# Event columns written per table, excluding id and the Kafka source coordinates
+EVENT_COLUMNS = {
+    'http_requests': ('event_id', 'timestamp', 'user_ip', 'method', 'endpoint', 'hostname', 'os'),
+    'http_responses': ('event_id', 'timestamp', 'user_ip', 'status_code', 'response_time_ms'),
+    'errors': ('event_id', 'timestamp', 'error_message', 'error_type', 'endpoint'),
+}
+# (topic, partition, offset) of the Kafka message a row came from; unique, so
+# re-consuming or replaying a message never inserts a second row
+SOURCE_COLUMNS = ('source_topic', 'source_partition', 'source_offset')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_params(secret_name, region_name='us-east-1') -> dict:
+    """
+    Build PostgreSQL connection parameters from Secrets Manager credentials
+    """
+    client = boto3.client('secretsmanager', region_name=region_name, config=Config(
+        connect_timeout=DB_CONNECT_TIMEOUT, read_timeout=DB_CONNECT_TIMEOUT, retries={'max_attempts': 2}
+    ))
+    response = client.get_secret_value(SecretId=secret_name)
+    secret = json.loads(response['SecretString'])
+    return {
+        'host': RDS_HOST,
+        'port': secret.get('port', 5432),
+        'database': DATABASE_NAME,
+        'user': secret['username'],
+        'password': secret['password'],
+        'connect_timeout': DB_CONNECT_TIMEOUT,
+    }
+
+
 # PostgreSQL connection via Secrets Manager
 def connect_to_postgres_with_secrets(secret_name, region_name='us-east-1'):
     """
     Connect to PostgreSQL using credentials from Secrets Manager
     """
-    # Get credentials from Secrets Manager
-    client = boto3.client('secretsmanager', region_name=region_name)
-    rds_host = 'simple-time-service-postgres.co18eum88817.us-east-1.rds.amazonaws.com'
-
     try:
-        response = client.get_secret_value(SecretId=secret_name)
-        secret = json.loads(response['SecretString'])
-        
-        # Get database name (hardcoded to 'simple')
-        database = 'simple_time_service'
-        connection = psycopg2.connect(
-            host = rds_host,
-            port=secret.get('port', 5432),
-            database=database,
-            user=secret['username'],
-            password=secret['password']
-        )
-        
-        logger.info(f"Connected to PostgreSQL at {rds_host}:{secret.get('port', 5432)}/{database} as {secret['username']}")
+        params = get_connection_params(secret_name, region_name)
+        connection = psycopg2.connect(**params)
+        logger.info(f"Connected to PostgreSQL at {params['host']}:{params['port']}/{params['database']} as {params['user']}")
         return connection
-        
+
     except Exception as e:
-        logger.error(f"Error connecting to database:  {str(e)}")
+        logger.error("Error connecting to database: %s", e)
         return None
 
 
+def get_pool():
+    """Get the shared connection pool, creating it on first use"""
+    global _pool
+    if _pool:
+        return _pool
+    with _pool_lock:
+        if not _pool:
+            params = get_connection_params(SECRET_NAME, REGION_NAME)
+            _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **params)
+            logger.info(f"PostgreSQL pool ready at {params['host']}:{params['port']}/{params['database']} ({DB_POOL_MIN}-{DB_POOL_MAX} connections)")
+    return _pool
+
+
+def close_pool():
+    """Close all pooled connections"""
+    global _pool
+    with _pool_lock:
+        if _pool:
+            try:
+                _pool.closeall()
+            except Exception as e:
+                logger.warning(f"Error closing connection pool: {str(e)}")
+            _pool = None
+
+
 def get_connection():
-    """Get a database connection using Secrets Manager"""
+    """Get a pooled database connection"""
     try:
-        conn = connect_to_postgres_with_secrets(SECRET_NAME, REGION_NAME)
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         logger.error(f"Failed to get database connection: {str(e)}")
         return None
 
 
 def return_connection(conn):
-    """Close a database connection"""
-    if conn:
-        try:
+    """Return a connection to the pool, discarding it if it is broken"""
+    if not conn:
+        return
+    pool = _pool
+    try:
+        if conn.closed:
+            if pool:
+                pool.putconn(conn, close=True)
+            return
+        conn.rollback()
+        if pool:
+            pool.putconn(conn)
+        else:
             conn.close()
-        except Exception as e:
-            logger.warning(f"Error closing connection: {str(e)}")
+    except Exception as e:
+        logger.warning(f"Error returning connection: {str(e)}")
+        try:
+            if pool:
+                pool.putconn(conn, close=True)
+            else:
+                conn.close()
+        except Exception:
+            pass
+
+
+def ping(timeout: float = None) -> bool:
+    """Cheap liveness check on a pooled connection (SELECT 1); `timeout`
+    bounds the query with a transaction-local statement_timeout"""
+    conn = get_connection()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        if timeout:
+            cursor.execute('SET LOCAL statement_timeout = %s', (int(timeout * 1000),))
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        return True
+    finally:
+        return_connection(conn)
 
 
 def init_db():
@@ -111,6 +197,23 @@ def init_db():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_http_requests_timestamp ON http_requests(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_http_responses_timestamp ON http_responses(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_errors_timestamp ON errors(timestamp)')
+        # Kafka source coordinates for idempotent ingestion
+        for table in EVENT_COLUMNS:
+            cursor.execute(f'''
+                ALTER TABLE {table}
+                    ADD COLUMN IF NOT EXISTS source_topic TEXT,
+                    ADD COLUMN IF NOT EXISTS source_partition INTEGER,
+                    ADD COLUMN IF NOT EXISTS source_offset BIGINT
+            ''')
+            cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_source ON {table}(source_topic, source_partition, source_offset)')
+            # Producer-assigned event ID; also catches producer retries and re-published events
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS event_id TEXT')
+            cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_event_id ON {table}(event_id)')
+
+        # Keyset pagination for exports walks (timestamp, id)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_http_requests_timestamp_id ON http_requests(timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_http_responses_timestamp_id ON http_responses(timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_errors_timestamp_id ON errors(timestamp, id)')
 
         conn.commit()
         logger.info("Database initialized successfully")
@@ -126,70 +229,107 @@ def init_db():
             return_connection(conn)
 
 
-def insert_request(user_ip: str, method: str, endpoint: str, hostname: str, os: str):
-    """Insert HTTP request event"""
+def bulk_insert(table: str, rows: list, page_size: int = 1000) -> int:
+    """Insert many rows of EVENT_COLUMNS + SOURCE_COLUMNS in one transaction.
+
+    Rows whose event ID or source coordinates already exist are skipped. Returns the
+    number of rows actually inserted; raises on failure so callers can retry
+    the whole batch.
+    """
+    if table not in EVENT_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    if not rows:
+        return 0
+
+    columns = ', '.join(EVENT_COLUMNS[table] + SOURCE_COLUMNS)
+    conn = get_connection()
+    if not conn:
+        raise RuntimeError("Could not connect to database")
     try:
-        conn = get_connection()
-        if not conn:
-            logger.error("Could not connect to database")
-            return False
-        
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO http_requests (timestamp, user_ip, method, endpoint, hostname, os)
-            VALUES (CURRENT_TIMESTAMP, %s, %s, %s, %s, %s)
-        ''', (user_ip, method, endpoint, hostname, os))
+        inserted = execute_values(
+            cursor,
+            f'''
+                INSERT INTO {table} ({columns}) VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING 1
+            ''',
+            rows,
+            page_size=page_size,
+            fetch=True
+        )
         conn.commit()
-        return True
-    except Exception as e:
-        logger.warning(f"Failed to insert request: {str(e)}")
-        return False
+        return len(inserted)
     finally:
-        if conn:
-            return_connection(conn)
+        return_connection(conn)
+
 
+# Errors caused by the rows themselves (bad values, constraint violations, NUL
+# bytes psycopg2 refuses to send); retrying the same rows can never succeed
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, ValueError)
 
-def insert_response(user_ip: str, status_code: int, response_time_ms: float):
-    """Insert HTTP response event"""
+
+def bulk_insert_isolating(table: str, rows: list, page_size: int = 1000) -> tuple:
+    """bulk_insert that survives rows the database rejects.
+
+    A batch failing with a ROW_ERRORS error is bisected until the offending
+    rows are found; every other row is still inserted. Returns (inserted,
+    rejected_rows). Connection and server errors still raise, so callers can
+    retry those.
+    """
+    try:
+        return bulk_insert(table, rows, page_size), []
+    except ROW_ERRORS as e:
+        if len(rows) == 1:
+            logger.warning(f"Rejected {table} row from {rows[0][-3:]}: {str(e).strip()}")
+            return 0, list(rows)
+
+    middle = len(rows) // 2
+    inserted, rejected = bulk_insert_isolating(table, rows[:middle], page_size)
+    more_inserted, more_rejected = bulk_insert_isolating(table, rows[middle:], page_size)
+    return inserted + more_inserted, rejected + more_rejected
+
+
+def existing_event_ids(table: str, event_ids: list) -> set:
+    """Subset of `event_ids` already stored in `table` (one indexed lookup)"""
+    if table not in EVENT_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    if not event_ids:
+        return set()
+
+    conn = get_connection()
+    if not conn:
+        raise RuntimeError("Could not connect to database")
     try:
-        conn = get_connection()
-        if not conn:
-            logger.error("Could not connect to database")
-            return False
-        
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO http_responses (timestamp, user_ip, status_code, response_time_ms)
-            VALUES (CURRENT_TIMESTAMP, %s, %s, %s)
-        ''', (user_ip, status_code, response_time_ms))
-        conn.commit()
-        return True
-    except Exception as e:
-        logger.warning(f"Failed to insert response: {str(e)}")
-        return False
+        cursor.execute(f'SELECT event_id FROM {table} WHERE event_id = ANY(%s)', (list(event_ids),))
+        return {row[0] for row in cursor.fetchall()}
     finally:
-        if conn:
-            return_connection(conn)
+        return_connection(conn)
+
 
+def recent_event_ids(table: str, topic: str, partitions: list, limit: int) -> list:
+    """Event IDs of the last `limit` rows `table` received from each partition
+    of `topic` (walks the source index backwards, one query per partition)"""
+    if table not in EVENT_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    if not partitions or limit <= 0:
+        return []
 
-def insert_error(error_message: str, error_type: str, endpoint: str = None):
-    """Insert error event"""
+    conn = get_connection()
+    if not conn:
+        raise RuntimeError("Could not connect to database")
     try:
-        conn = get_connection()
-        if not conn:
-            logger.error("Could not connect to database")
-            return False
-        
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO errors (timestamp, error_message, error_type, endpoint)
-            VALUES (CURRENT_TIMESTAMP, %s, %s, %s)
-        ''', (error_message, error_type, endpoint))
-        conn.commit()
-        return True
-    except Exception as e:
-        logger.warning(f"Failed to insert error: {str(e)}")
-        return False
+        event_ids = []
+        for partition in partitions:
+            cursor.execute(f'''
+                SELECT event_id FROM {table}
+                WHERE source_topic = %s AND source_partition = %s AND event_id IS NOT NULL
+                ORDER BY source_offset DESC
+                LIMIT %s
+            ''', (topic, partition, limit))
+            event_ids.extend(row[0] for row in cursor.fetchall())
+        return event_ids
     finally:
-        if conn:
-            return_connection(conn)
+        return_connection(conn)
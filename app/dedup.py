@@ -0,0 +1,72 @@
+"""Memory-bounded probabilistic filter of recently seen event IDs"""
+import hashlib
+import math
+import threading
+import time
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for `capacity` items at `error_rate`"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RotatingBloomFilter:
+    """Two Bloom generations: lookups check both, inserts go to the current one.
+
+    The current generation is retired once it holds `capacity` items or is
+    `window_seconds` old, so memory stays at two filters and the filter
+    remembers at least the last `capacity` IDs or `window_seconds` of them.
+    A hit means "probably seen" and must be confirmed; a miss is definitive.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, window_seconds: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window_seconds = window_seconds
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = None
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def size_bytes(self) -> int:
+        """Memory held by the bit arrays once both generations exist"""
+        return len(self._current.bits) * 2
+
+    def _maybe_rotate(self) -> None:
+        if (self._current.count >= self.capacity
+                or time.monotonic() - self._rotated_at >= self.window_seconds):
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = time.monotonic()
+
+    def add(self, item: str) -> None:
+        with self._lock:
+            self._maybe_rotate()
+            self._current.add(item)
+
+    def might_contain(self, item: str) -> bool:
+        current, previous = self._current, self._previous
+        return item in current or (previous is not None and item in previous)
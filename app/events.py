@@ -0,0 +1,197 @@
+"""Typed event records decoded from Kafka messages"""
+import json
+import math
+from datetime import datetime, timezone
+from typing import Dict, Optional, Type
+
+from database import EVENT_COLUMNS
+
+
+# PostgreSQL INTEGER range
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+class InvalidEvent(ValueError):
+    """Message cannot be decoded into a valid event"""
+
+
+def _str(data: dict, field: str, required: bool = False) -> Optional[str]:
+    value = data.get(field)
+    if value is None:
+        if required:
+            raise InvalidEvent(f"missing field: {field}")
+        return None
+    if not isinstance(value, str):
+        raise InvalidEvent(f"{field} must be a string")
+    # PostgreSQL text cannot hold NUL characters
+    if '\x00' in value:
+        raise InvalidEvent(f"{field} contains a NUL character")
+    return value
+
+
+def _number(data: dict, field: str, default=None, integer: bool = False):
+    value = data.get(field, default)
+    if value is None:
+        raise InvalidEvent(f"missing field: {field}")
+    # bool is an int subclass but never a valid status code or latency
+    if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+        raise InvalidEvent(f"{field} must be {'an integer' if integer else 'a number'}")
+    if integer:
+        if not INT_MIN <= value <= INT_MAX:
+            raise InvalidEvent(f"{field} out of range")
+    else:
+        # json.loads accepts NaN/Infinity, and huge ints overflow FLOAT
+        try:
+            finite = math.isfinite(value)
+        except OverflowError:
+            finite = False
+        if not finite:
+            raise InvalidEvent(f"{field} out of range")
+    return value
+
+
+def _timestamp(data: dict) -> datetime:
+    """ISO 8601 timestamp as naive UTC, matching the TIMESTAMP columns"""
+    value = _str(data, 'timestamp', required=True)
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        raise InvalidEvent(f"invalid timestamp: {value[:64]}") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class Event:
+    """Base event; `source` is the (topic, partition, offset) it was read from
+    and `event_id` the producer-assigned ID (None for older messages)"""
+
+    __slots__ = ('timestamp', 'source', 'event_id')
+    event_type = None
+    table = None
+
+    def __init__(self, timestamp: datetime, source: tuple = None):
+        self.timestamp = timestamp
+        self.source = source
+        self.event_id = None
+
+    def row(self) -> tuple:
+        """Values for database.bulk_insert: EVENT_COLUMNS[table] + source columns"""
+        return tuple(getattr(self, column) for column in EVENT_COLUMNS[self.table]) + (self.source or (None, None, None))
+
+
+class HttpRequestEvent(Event):
+    __slots__ = ('user_ip', 'method', 'endpoint', 'hostname', 'os')
+    event_type = 'http_request'
+    table = 'http_requests'
+
+    def __init__(self, timestamp, user_ip, method, endpoint, hostname=None, os=None, source=None):
+        super().__init__(timestamp, source)
+        self.user_ip = user_ip
+        self.method = method
+        self.endpoint = endpoint
+        self.hostname = hostname
+        self.os = os
+
+    @classmethod
+    def from_data(cls, timestamp, data, source=None):
+        return cls(
+            timestamp,
+            _str(data, 'user_ip'),
+            _str(data, 'method', required=True),
+            _str(data, 'endpoint', required=True),
+            _str(data, 'hostname'),
+            _str(data, 'os'),
+            source
+        )
+
+
+class HttpResponseEvent(Event):
+    __slots__ = ('user_ip', 'status_code', 'response_time_ms')
+    event_type = 'http_response'
+    table = 'http_responses'
+
+    def __init__(self, timestamp, user_ip, status_code, response_time_ms=0, source=None):
+        super().__init__(timestamp, source)
+        self.user_ip = user_ip
+        self.status_code = status_code
+        self.response_time_ms = response_time_ms
+
+    @classmethod
+    def from_data(cls, timestamp, data, source=None):
+        return cls(
+            timestamp,
+            _str(data, 'user_ip'),
+            _number(data, 'status_code', integer=True),
+            _number(data, 'response_time_ms', default=0),
+            source
+        )
+
+
+class ErrorEvent(Event):
+    __slots__ = ('error_message', 'error_type', 'endpoint')
+    event_type = 'error'
+    table = 'errors'
+
+    def __init__(self, timestamp, error_message, error_type, endpoint=None, source=None):
+        super().__init__(timestamp, source)
+        self.error_message = error_message
+        self.error_type = error_type
+        self.endpoint = endpoint
+
+    @classmethod
+    def from_data(cls, timestamp, data, source=None):
+        return cls(
+            timestamp,
+            _str(data, 'error_message', required=True),
+            _str(data, 'error_type', required=True),
+            _str(data, 'endpoint'),
+            source
+        )
+
+
+class CustomEvent(Event):
+    """Event type with no typed schema (e.g. from /kafka/publish); data is kept as-is"""
+
+    __slots__ = ('event_type', 'data')
+
+    def __init__(self, timestamp, event_type, data, source=None):
+        super().__init__(timestamp, source)
+        self.event_type = event_type
+        self.data = data
+
+
+EVENT_TYPES: Dict[str, Type[Event]] = {
+    cls.event_type: cls for cls in (HttpRequestEvent, HttpResponseEvent, ErrorEvent)
+}
+
+
+def decode(raw: bytes, source: tuple = None) -> Event:
+    """Decode and validate a message value in one pass; raises InvalidEvent"""
+    try:
+        value = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidEvent(f"not JSON: {e}") from None
+    if not isinstance(value, dict):
+        raise InvalidEvent("message is not an object")
+
+    event_type = value.get('event_type')
+    if not isinstance(event_type, str):
+        raise InvalidEvent("missing event_type")
+    timestamp = _timestamp(value)
+    event_id = _str(value, 'event_id')
+    if event_id is not None and not 0 < len(event_id) <= 64:
+        raise InvalidEvent("invalid event_id")
+    data = value.get('data')
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        raise InvalidEvent("data is not an object")
+
+    cls = EVENT_TYPES.get(event_type)
+    if cls is None:
+        event = CustomEvent(timestamp, event_type, data, source)
+    else:
+        event = cls.from_data(timestamp, data, source)
+    event.event_id = event_id
+    return event
@@ -0,0 +1,277 @@
+"""Streaming bulk export of event tables to compressed files
+
+Usage:
+    python export.py --tables http_requests errors \
+        --start 2026-01-01 --end 2026-02-01 --split day --format csv --workers 4
+
+Rows are read with keyset pagination on (timestamp, id) through server-side
+cursors, so memory stays constant regardless of table size. Exports use their
+own connections, never the app's shared pool, so a long export cannot starve
+the consumer or the health probes. Each
+(table, time slice) pair becomes one output file and is exported in its own
+worker process.
+"""
+import argparse
+import csv
+import gzip
+import io
+import logging
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from database import SECRET_NAME, REGION_NAME, connect_to_postgres_with_secrets
+
+logger = logging.getLogger(__name__)
+
+# Export configuration from environment variables
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', '50000'))
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '5000'))
+EXPORT_DIR = os.getenv('EXPORT_DIR', './exports')
+
+# Exportable tables and their columns; also serves as the identifier whitelist
+TABLES = {
+    'http_requests': ['id', 'timestamp', 'event_id', 'user_ip', 'method', 'endpoint', 'hostname', 'os'],
+    'http_responses': ['id', 'timestamp', 'event_id', 'user_ip', 'status_code', 'response_time_ms'],
+    'errors': ['id', 'timestamp', 'event_id', 'error_message', 'error_type', 'endpoint'],
+}
+
+SPLITS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+FORMATS = ('csv', 'parquet')
+
+
+def _connect():
+    """Dedicated connection for one export; closed when the export finishes"""
+    conn = connect_to_postgres_with_secrets(SECRET_NAME, REGION_NAME)
+    if not conn:
+        raise RuntimeError("Could not connect to database")
+    return conn
+
+
+def iter_batches(table: str, start: datetime, end: datetime,
+                 page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[tuple]]:
+    """Yield row batches of `table` in [start, end) ordered by (timestamp, id)"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+
+    columns = ', '.join(TABLES[table])
+    first_page = f'''
+        SELECT {columns} FROM {table}
+        WHERE timestamp >= %s AND timestamp < %s
+        ORDER BY timestamp, id LIMIT %s
+    '''
+    next_page = f'''
+        SELECT {columns} FROM {table}
+        WHERE (timestamp, id) > (%s, %s) AND timestamp < %s
+        ORDER BY timestamp, id LIMIT %s
+    '''
+
+    conn = _connect()
+    try:
+        # Snapshot reads; no locks are held between pages
+        conn.set_session(readonly=True)
+        last_key: Optional[Tuple[datetime, int]] = None
+        page = 0
+        while True:
+            # Named cursor = server-side cursor: rows stream in EXPORT_FETCH_SIZE chunks
+            cursor = conn.cursor(name=f'export_{table}_{page}')
+            if last_key is None:
+                cursor.execute(first_page, (start, end, page_size))
+            else:
+                cursor.execute(next_page, (*last_key, end, page_size))
+
+            rows_in_page = 0
+            while True:
+                batch = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not batch:
+                    break
+                rows_in_page += len(batch)
+                last_key = (batch[-1][1], batch[-1][0])
+                yield batch
+            cursor.close()
+            conn.commit()
+
+            if rows_in_page < page_size:
+                break
+            page += 1
+    finally:
+        conn.close()
+
+
+def stream_csv_gzip(table: str, batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Yield a gzip-compressed CSV of `table` row batches chunk by chunk"""
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(TABLES[table])
+    for batch in batches:
+        writer.writerows(batch)
+        chunk = compressor.compress(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+        if chunk:
+            yield chunk
+    chunk = compressor.compress(buffer.getvalue().encode('utf-8'))
+    yield chunk + compressor.flush()
+
+
+def open_csv_gzip(table: str, start: datetime, end: datetime) -> Iterator[bytes]:
+    """Connect and fetch the first batch now, then stream the rest lazily.
+
+    Connection and query failures raise here, before any response is sent,
+    instead of truncating a body whose 200 headers are already out.
+    """
+    batches = iter_batches(table, start, end)
+    first = next(batches, None)
+    return stream_csv_gzip(table, chain([first] if first else [], batches))
+
+
+def _write_csv(table: str, start: datetime, end: datetime, path: str) -> int:
+    rows = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLES[table])
+        for batch in iter_batches(table, start, end):
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def _write_parquet(table: str, start: datetime, end: datetime, path: str) -> int:
+    # pyarrow is optional and only needed for columnar output
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        'id': pa.int64(),
+        'timestamp': pa.timestamp('us'),
+        'status_code': pa.int32(),
+        'response_time_ms': pa.float64(),
+    }
+    schema = pa.schema([(name, types.get(name, pa.string())) for name in TABLES[table]])
+    rows = 0
+    writer = None
+    try:
+        for batch in iter_batches(table, start, end):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema, compression='zstd')
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+    finally:
+        if writer:
+            writer.close()
+    return rows
+
+
+def export_slice(table: str, start: datetime, end: datetime,
+                 fmt: str = 'csv', out_dir: str = EXPORT_DIR) -> Tuple[str, int]:
+    """Export one table/time slice to a file; returns (path, row count)"""
+    os.makedirs(os.path.join(out_dir, table), exist_ok=True)
+    suffix = 'csv.gz' if fmt == 'csv' else 'parquet'
+    name = f"{table}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{suffix}"
+    path = os.path.join(out_dir, table, name)
+    tmp_path = path + '.part'
+
+    if fmt == 'parquet':
+        rows = _write_parquet(table, start, end, tmp_path)
+    else:
+        rows = _write_csv(table, start, end, tmp_path)
+
+    if rows or fmt == 'csv':
+        os.replace(tmp_path, path)
+    else:
+        # ParquetWriter never opened a file for an empty slice
+        path = None
+    return path, rows
+
+
+def time_slices(start: datetime, end: datetime, split: Optional[str]) -> List[Tuple[datetime, datetime]]:
+    """Split [start, end) into consecutive slices"""
+    if not split:
+        return [(start, end)]
+    step = SPLITS[split]
+    slices = []
+    cursor = start
+    while cursor < end:
+        slices.append((cursor, min(cursor + step, end)))
+        cursor += step
+    return slices
+
+
+def table_start(table: str) -> Optional[datetime]:
+    """Earliest timestamp in `table`"""
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT MIN(timestamp) FROM {table}')
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_export(tables: List[str], start: Optional[datetime], end: Optional[datetime],
+               split: Optional[str], fmt: str, out_dir: str, workers: int) -> int:
+    """Export every (table, slice) job across worker processes; returns total
+    rows, or exits non-zero listing the failed jobs"""
+    end = end or datetime.utcnow()
+    jobs = []
+    for table in tables:
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        table_from = start or table_start(table)
+        if table_from is None:
+            logger.info("Table %s is empty, skipping", table)
+            continue
+        for slice_start, slice_end in time_slices(table_from, end, split):
+            jobs.append((table, slice_start, slice_end))
+
+    total = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(export_slice, table, s, e, fmt, out_dir): (table, s, e)
+            for table, s, e in jobs
+        }
+        for future in as_completed(futures):
+            table, s, e = futures[future]
+            try:
+                path, rows = future.result()
+                total += rows
+                logger.info("Exported %s [%s, %s): %d rows -> %s", table, s, e, rows, path)
+            except Exception as ex:
+                failed.append((table, s, e))
+                logger.error("Export of %s [%s, %s) failed: %s", table, s, e, ex)
+    if failed:
+        raise SystemExit(f"{len(failed)} of {len(jobs)} export jobs failed: "
+                         + ', '.join(f"{t} [{s}, {e})" for t, s, e in sorted(failed)))
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export event tables to compressed files")
+    parser.add_argument('--tables', nargs='+', choices=sorted(TABLES), default=sorted(TABLES))
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Inclusive UTC start (default: earliest row)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Exclusive UTC end (default: now)")
+    parser.add_argument('--split', choices=sorted(SPLITS), help="Write one file per time slice")
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default='csv')
+    parser.add_argument('--out', default=EXPORT_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    total = run_export(args.tables, args.start, args.end, args.split, args.fmt, args.out, args.workers)
+    logger.info("Export complete: %d rows", total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Background dependency health prober with a cached snapshot"""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from kafka_config import KAFKA_BROKERS
+from database import ping as postgres_ping
+
+logger = logging.getLogger(__name__)
+
+# Probe configuration from environment variables
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv('HEALTH_PROBE_INTERVAL_SECONDS', '10'))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv('HEALTH_PROBE_TIMEOUT_SECONDS', '3'))
+# Results older than this many intervals are reported as unknown
+HEALTH_STALE_INTERVALS = 3
+# Dependencies that must be up for /readyz to report ready (comma separated)
+HEALTH_REQUIRED_DEPENDENCIES = [
+    d.strip() for d in os.getenv('HEALTH_REQUIRED_DEPENDENCIES', '').split(',') if d.strip()
+]
+
+UP = 'up'
+DOWN = 'down'
+UNKNOWN = 'unknown'
+
+
+class HealthProber:
+    """Periodically probes dependencies off the request path.
+
+    Probes run concurrently, each on its own daemon thread, and each result
+    is published as soon as it arrives by swapping in a new snapshot dict with
+    a single assignment, so readers never need a lock and never block on a
+    probe. A probe still running at the round's deadline is reported down;
+    a hung probe is not restarted until it returns.
+    """
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL_SECONDS,
+                 timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS):
+        self.interval = interval
+        self.timeout = timeout
+        self.probes: Dict[str, Callable[[], None]] = {}
+        self.snapshot: Dict[str, dict] = {}
+        self.last_run: Optional[float] = None
+        self._in_flight: Dict[str, Future] = {}
+        self.is_running = False
+        self.prober_thread = None
+        self._stop_event = threading.Event()
+        self._kafka_admin = None
+        self._probe_duration = None
+        self._dependency_up = None
+        self._init_metrics()
+
+    def _init_metrics(self):
+        """Register probe metrics with graceful degradation"""
+        try:
+            from prometheus_client import Gauge, Histogram
+
+            self._probe_duration = Histogram(
+                'dependency_probe_duration_seconds',
+                'Dependency health probe latency',
+                ['dependency']
+            )
+            self._dependency_up = Gauge(
+                'dependency_up',
+                'Whether the dependency passed its last health probe',
+                ['dependency']
+            )
+        except Exception as e:
+            logger.warning(f"Health probe metrics initialization failed: {str(e)}")
+
+    def register_probe(self, name: str, probe: Callable[[], None]):
+        """Register a probe; it should raise (or return False) when unhealthy"""
+        self.probes[name] = probe
+        self.snapshot = {**self.snapshot, name: {'status': UNKNOWN}}
+
+    def status(self, name: str) -> str:
+        """Last known status of a dependency; unknown once the result is stale"""
+        result = self.snapshot.get(name, {})
+        checked_at = result.get('checked_at')
+        if checked_at is None or time.time() - checked_at > self.interval * HEALTH_STALE_INTERVALS + self.timeout:
+            return UNKNOWN
+        return result['status']
+
+    def is_ready(self) -> bool:
+        """Ready once a full round has run and every required dependency is
+        up with a fresh result"""
+        if self.last_run is None:
+            return False
+        return all(self.status(name) == UP for name in HEALTH_REQUIRED_DEPENDENCIES)
+
+    def start(self):
+        """Start probing in background thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._stop_event.clear()
+        self.prober_thread = threading.Thread(target=self._probe_loop, name='health-prober', daemon=True)
+        self.prober_thread.start()
+        logger.info(f"Health prober started - probing {list(self.probes)} every {self.interval}s")
+
+    def stop(self):
+        """Stop prober"""
+        self.is_running = False
+        self._stop_event.set()
+        if self.prober_thread:
+            self.prober_thread.join(timeout=self.timeout + 1)
+        if self._kafka_admin:
+            try:
+                self._kafka_admin.close()
+            except Exception as e:
+                logger.warning(f"Close error: {str(e)}")
+            self._kafka_admin = None
+        logger.info("Health prober stopped")
+
+    def _submit(self, name: str, probe: Callable[[], None]) -> Future:
+        """Run a probe on its own daemon thread; resolves to (healthy, error, seconds)"""
+        future = Future()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                healthy, error = probe() is not False, None
+            except Exception as e:
+                healthy, error = False, str(e)
+            future.set_result((healthy, error, time.perf_counter() - started))
+
+        threading.Thread(target=run, name=f'health-probe-{name}', daemon=True).start()
+        return future
+
+    def _publish(self, name: str, healthy: bool, error: Optional[str], elapsed: float):
+        """Swap one probe result into the snapshot and update metrics"""
+        result = {
+            'status': UP if healthy else DOWN,
+            'latency_ms': round(elapsed * 1000, 2),
+            'checked_at': time.time(),
+        }
+        if error:
+            result['error'] = error
+        previous = self.snapshot.get(name, {}).get('status')
+        self.snapshot = {**self.snapshot, name: result}
+
+        if self._probe_duration:
+            self._probe_duration.labels(dependency=name).observe(elapsed)
+        if self._dependency_up:
+            self._dependency_up.labels(dependency=name).set(1 if healthy else 0)
+        if previous != result['status']:
+            logger.info("Dependency %s is %s", name, result['status'])
+
+    def run_once(self):
+        """Run every probe concurrently under the probe timeout, publishing
+        each result as it completes"""
+        deadline = time.perf_counter() + self.timeout
+        pending = {}
+        for name, probe in self.probes.items():
+            future = self._in_flight.get(name)
+            if future is None:
+                future = self._in_flight[name] = self._submit(name, probe)
+            pending[future] = name
+
+        while pending:
+            done, _ = wait(list(pending), timeout=max(0.0, deadline - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                name = pending.pop(future)
+                del self._in_flight[name]
+                self._publish(name, *future.result())
+
+        for name in pending.values():
+            self._publish(name, False, f"timed out after {self.timeout}s", self.timeout)
+        self.last_run = time.time()
+
+    def _probe_loop(self):
+        """Main probe loop"""
+        while self.is_running:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning("Health probe round failed: %s", e)
+            self._stop_event.wait(self.interval)
+
+    def probe_postgres(self):
+        """Pooled SELECT 1 under a statement timeout"""
+        return postgres_ping(timeout=self.timeout)
+
+    def probe_kafka(self):
+        """Cluster metadata fetch through a dedicated admin client"""
+        if not self._kafka_admin:
+            from kafka import KafkaAdminClient
+
+            self._kafka_admin = KafkaAdminClient(
+                bootstrap_servers=KAFKA_BROKERS,
+                client_id='simple-time-service-health',
+                request_timeout_ms=int(self.timeout * 1000)
+            )
+        try:
+            cluster = self._kafka_admin.describe_cluster()
+        except Exception:
+            # Drop the client so the next round reconnects from scratch
+            try:
+                self._kafka_admin.close()
+            except Exception:
+                pass
+            self._kafka_admin = None
+            raise
+        return bool(cluster.get('brokers'))
+
+    def probe_otlp(self):
+        """TCP connect to the OTLP collector endpoint"""
+        endpoint = urlparse(os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://otel-collector:4317"))
+        with socket.create_connection((endpoint.hostname, endpoint.port or 4317), timeout=self.timeout):
+            return True
+
+
+def get_prober(kafka_enabled: bool = True, otlp_enabled: bool = True) -> HealthProber:
+    """Get prober instance with the standard dependency probes registered"""
+    prober = HealthProber()
+    prober.register_probe('postgres', prober.probe_postgres)
+    if kafka_enabled:
+        prober.register_probe('kafka', prober.probe_kafka)
+    if otlp_enabled:
+        prober.register_probe('opentelemetry', prober.probe_otlp)
+    return prober
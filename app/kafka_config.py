@@ -1,17 +1,187 @@
 """Kafka configuration"""
 import os
+import socket
 import logging
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
+
+def _parse_mapping(spec: str) -> Dict[str, str]:
+    """Parse "key=value,key=value" into a dict"""
+    mapping = {}
+    for entry in spec.split(','):
+        key, sep, value = entry.partition('=')
+        if sep and key.strip() and value.strip():
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
 # Kafka configuration from environment variables
 KAFKA_BROKERS = os.getenv('KAFKA_BROKERS', 'localhost:9092').split(',')
 KAFKA_TOPIC_EVENTS = os.getenv('KAFKA_TOPIC_EVENTS', 'simple-time-service-events')
 KAFKA_CONSUMER_GROUP = os.getenv('KAFKA_CONSUMER_GROUP', 'simple-time-service-group')
 
+# event_type -> topic, e.g. "http_request=sts-requests,error=sts-errors".
+# Unlisted event types go to KAFKA_TOPIC_EVENTS.
+KAFKA_TOPIC_ROUTES = _parse_mapping(os.getenv('KAFKA_TOPIC_ROUTES', ''))
+# event_type -> data field used as the message key; "*" sets the default.
+# "hostname" falls back to this host's name when the event has no such field.
+KAFKA_KEY_FIELDS = _parse_mapping(os.getenv('KAFKA_KEY_FIELDS', '*=user_ip'))
+# Event types this instance consumes (comma separated); empty means all routed topics.
+# A subset gets its own consumer group (see consumer_group) so instances with
+# different subsets each read every message on a topic they share.
+KAFKA_CONSUMER_EVENT_TYPES = [
+    t.strip() for t in os.getenv('KAFKA_CONSUMER_EVENT_TYPES', '').split(',') if t.strip()
+]
+
+# Consumer-side duplicate filter: remembers at least this many recent event IDs
+# (or this many seconds of them) at the given false-positive rate
+KAFKA_DEDUP_CAPACITY = int(os.getenv('KAFKA_DEDUP_CAPACITY', '500000'))
+KAFKA_DEDUP_ERROR_RATE = float(os.getenv('KAFKA_DEDUP_ERROR_RATE', '0.001'))
+KAFKA_DEDUP_WINDOW_SECONDS = float(os.getenv('KAFKA_DEDUP_WINDOW_SECONDS', '3600'))
+# Event IDs loaded per assigned partition (and table) when the consumer gets
+# partitions, so redeliveries after a restart or rebalance are recognised
+KAFKA_DEDUP_SEED_ROWS = int(os.getenv('KAFKA_DEDUP_SEED_ROWS', '5000'))
+
+# Producer throughput profile: low-latency, balanced, max-throughput or adaptive
+KAFKA_PRODUCER_PROFILE = os.getenv('KAFKA_PRODUCER_PROFILE', 'balanced')
+# Adaptive mode re-tunes linger/batch size this often, within these bounds
+KAFKA_ADAPTIVE_INTERVAL_SECONDS = float(os.getenv('KAFKA_ADAPTIVE_INTERVAL_SECONDS', '10'))
+KAFKA_ADAPTIVE_MAX_LINGER_MS = int(os.getenv('KAFKA_ADAPTIVE_MAX_LINGER_MS', '50'))
+KAFKA_ADAPTIVE_MAX_BATCH_SIZE = int(os.getenv('KAFKA_ADAPTIVE_MAX_BATCH_SIZE', str(1024 * 1024)))
+
+_hostname = socket.gethostname()
+
+
+def _compression(*preferred: str) -> Optional[str]:
+    """First codec in `preferred` whose library is installed (gzip always is)"""
+    from kafka import codec
+
+    available = {
+        'zstd': codec.has_zstd,
+        'lz4': codec.has_lz4,
+        'snappy': codec.has_snappy,
+        'gzip': codec.has_gzip,
+    }
+    for name in preferred:
+        if available[name]():
+            return name
+    return None
+
+
+# KafkaProducer settings per profile; adaptive starts from balanced.
+# The producer retries forever, so with more than one request in flight a
+# retried batch can land behind a later one and reorder a partition. Profiles
+# that keep per-key order therefore send one request at a time; balanced also
+# turns on idempotence (kafka-python requires acks='all' and in-flight 1 for
+# it) so retries cannot duplicate records either. max-throughput trades
+# ordering on retry for pipelining.
+PRODUCER_PROFILES = {
+    'low-latency': lambda: {
+        'acks': 1,
+        'linger_ms': 0,
+        'batch_size': 16 * 1024,
+        'compression_type': None,
+        'max_in_flight_requests_per_connection': 1,
+    },
+    'balanced': lambda: {
+        'acks': 'all',
+        'enable_idempotence': True,
+        'linger_ms': 5,
+        'batch_size': 64 * 1024,
+        'compression_type': _compression('lz4', 'snappy', 'gzip'),
+        'max_in_flight_requests_per_connection': 1,
+    },
+    'max-throughput': lambda: {
+        'acks': 1,
+        'linger_ms': 50,
+        'batch_size': 512 * 1024,
+        'compression_type': _compression('zstd', 'lz4', 'gzip'),
+        'max_in_flight_requests_per_connection': 5,
+    },
+}
+PRODUCER_PROFILES['adaptive'] = PRODUCER_PROFILES['balanced']
+
+
+def producer_settings(profile: str = None) -> dict:
+    """KafkaProducer kwargs for a profile, with per-setting env overrides"""
+    profile = profile or KAFKA_PRODUCER_PROFILE
+    if profile not in PRODUCER_PROFILES:
+        logger.warning(f"Unknown producer profile '{profile}', using balanced")
+        profile = 'balanced'
+    settings = PRODUCER_PROFILES[profile]()
+
+    overrides = {
+        'acks': os.getenv('KAFKA_PRODUCER_ACKS'),
+        'linger_ms': os.getenv('KAFKA_PRODUCER_LINGER_MS'),
+        'batch_size': os.getenv('KAFKA_PRODUCER_BATCH_SIZE'),
+        'compression_type': os.getenv('KAFKA_PRODUCER_COMPRESSION'),
+        'max_in_flight_requests_per_connection': os.getenv('KAFKA_PRODUCER_MAX_IN_FLIGHT'),
+        'enable_idempotence': os.getenv('KAFKA_PRODUCER_IDEMPOTENCE'),
+    }
+    for key, value in overrides.items():
+        if value is None:
+            continue
+        if key == 'acks':
+            settings[key] = value if value == 'all' else int(value)
+        elif key == 'compression_type':
+            settings[key] = None if value == 'none' else value
+        elif key == 'enable_idempotence':
+            settings[key] = value.lower() in ('1', 'true', 'yes')
+        else:
+            settings[key] = int(value)
+
+    # KafkaProducer refuses idempotence with anything but acks='all' and one
+    # request in flight; an override of either turns it off instead
+    if settings.get('enable_idempotence') and (
+            settings['acks'] not in ('all', -1) or settings['max_in_flight_requests_per_connection'] != 1):
+        logger.warning("Producer idempotence disabled: it needs acks='all' and max in-flight 1")
+        settings['enable_idempotence'] = False
+    return settings
+
+
+def topic_for(event_type: str) -> str:
+    """Topic an event type is routed to"""
+    return KAFKA_TOPIC_ROUTES.get(event_type, KAFKA_TOPIC_EVENTS)
+
+
+def key_for(event_type: str, data) -> Optional[str]:
+    """Message key for an event, so related events land on one partition"""
+    field = KAFKA_KEY_FIELDS.get(event_type, KAFKA_KEY_FIELDS.get('*'))
+    if not field:
+        return None
+    value = data.get(field) if isinstance(data, dict) else None
+    if value is None and field == 'hostname':
+        value = _hostname
+    return str(value) if value is not None else None
+
+
+def consumer_topics(event_types: Optional[List[str]] = None) -> List[str]:
+    """Topics carrying the given event types (all routed topics when empty)"""
+    if event_types:
+        return sorted({topic_for(t) for t in event_types})
+    return sorted({KAFKA_TOPIC_EVENTS, *KAFKA_TOPIC_ROUTES.values()})
+
+
+def consumer_group(event_types: Optional[List[str]] = None) -> str:
+    """Group id for a consumer of `event_types`.
+
+    Consumers skip events outside their subset but still commit past them, so
+    two subsets sharing a topic must not share a group: each would drop the
+    other's events on the partitions it was assigned.
+    """
+    if event_types:
+        return f"{KAFKA_CONSUMER_GROUP}.{'+'.join(sorted(set(event_types)))}"
+    return KAFKA_CONSUMER_GROUP
+
 
 def log_kafka_config():
     """Log Kafka configuration"""
     logger.info(f"Kafka Brokers: {KAFKA_BROKERS}")
     logger.info(f"Events Topic: {KAFKA_TOPIC_EVENTS}")
-    logger.info(f"Consumer Group: {KAFKA_CONSUMER_GROUP}")
+    logger.info(f"Topic Routes: {KAFKA_TOPIC_ROUTES}")
+    logger.info(f"Key Fields: {KAFKA_KEY_FIELDS}")
+    logger.info(f"Producer Profile: {KAFKA_PRODUCER_PROFILE} {producer_settings()}")
+    logger.info(f"Consumer Group: {consumer_group(KAFKA_CONSUMER_EVENT_TYPES)}")
+    logger.info(f"Consumer Topics: {consumer_topics(KAFKA_CONSUMER_EVENT_TYPES)}")
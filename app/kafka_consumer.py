@@ -1,44 +1,93 @@
 """Simplified Kafka Consumer - writes events to database"""
-import json
 import logging
 import threading
-from kafka import KafkaConsumer
-from kafka_config import KAFKA_BROKERS, KAFKA_TOPIC_EVENTS, KAFKA_CONSUMER_GROUP
-from database import insert_request, insert_response, insert_error
+import time
+from kafka import ConsumerRebalanceListener, KafkaConsumer
+from kafka_config import (
+    KAFKA_BROKERS, KAFKA_CONSUMER_EVENT_TYPES, KAFKA_DEDUP_CAPACITY, KAFKA_DEDUP_ERROR_RATE,
+    KAFKA_DEDUP_WINDOW_SECONDS, KAFKA_DEDUP_SEED_ROWS, consumer_group, consumer_topics
+)
+from database import ROW_ERRORS, bulk_insert, existing_event_ids, recent_event_ids
+from dedup import RotatingBloomFilter
+from events import EVENT_TYPES, InvalidEvent, decode
 
 logger = logging.getLogger(__name__)
 
+# Messages fetched and dispatched per poll
+KAFKA_CONSUMER_MAX_POLL_RECORDS = 500
+
+
+def persist_events(events: list) -> None:
+    """Batch handler: write same-typed events to their table in one transaction"""
+    if not events:
+        return
+    bulk_insert(events[0].table, [event.row() for event in events])
+
+
+class _SeedOnAssign(ConsumerRebalanceListener):
+    """Seeds the service's duplicate filter for partitions it is assigned"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def on_partitions_revoked(self, revoked):
+        pass
+
+    def on_partitions_assigned(self, assigned):
+        self.service._seed(assigned)
+
 
 class KafkaConsumerService:
     """Simple Kafka consumer service - persists events to DB"""
     
-    def __init__(self, topics=None):
-        self.topics = topics or [KAFKA_TOPIC_EVENTS]
+    def __init__(self, topics=None, event_types=None):
+        self.event_types = event_types or KAFKA_CONSUMER_EVENT_TYPES
+        self.topics = topics or consumer_topics(self.event_types)
+        self.group_id = consumer_group(self.event_types)
         self.consumer = None
         self.is_running = False
         self.consumer_thread = None
         self.message_handlers = {}
+        self.batch_handlers = {}
+        self.invalid_messages = 0
+        self.duplicate_messages = 0
+        self.seen_event_ids = RotatingBloomFilter(
+            KAFKA_DEDUP_CAPACITY, KAFKA_DEDUP_ERROR_RATE, KAFKA_DEDUP_WINDOW_SECONDS
+        )
         self._lock = threading.Lock()
         
+        # Typed events are persisted in batches by default
+        for event_type in EVENT_TYPES:
+            self.register_handler(event_type, persist_events, batch=True)
+        
         try:
             self.consumer = KafkaConsumer(
-                *self.topics,
                 bootstrap_servers=KAFKA_BROKERS,
-                group_id=KAFKA_CONSUMER_GROUP,
+                group_id=self.group_id,
                 auto_offset_reset='earliest',
-                enable_auto_commit=True,
-                value_deserializer=lambda m: json.loads(m.decode('utf-8'))
+                enable_auto_commit=False,
+                max_poll_records=KAFKA_CONSUMER_MAX_POLL_RECORDS
             )
-            logger.info(f"Kafka Consumer initialized. Topics: {self.topics}")
+            self.consumer.subscribe(self.topics, listener=_SeedOnAssign(self))
+            logger.info(f"Kafka Consumer initialized. Topics: {self.topics}, group: {self.group_id}")
         except Exception as e:
             logger.warning(f"Kafka Consumer init failed: {str(e)}")
             self.consumer = None
     
-    def register_handler(self, event_type: str, handler):
-        """Register a handler for event type"""
+    def register_handler(self, event_type: str, handler, batch: bool = False):
+        """Register a handler for event type.
+
+        Plain handlers get one event at a time; an exception is logged and the
+        event skipped. Batch handlers get a list of every event of that type
+        in a poll; a database.ROW_ERRORS exception (bad data) is narrowed down
+        to the offending events, which are skipped as invalid, and any other
+        exception re-delivers the whole poll. Either way events may be handled
+        more than once, so batch handlers must be idempotent (bulk_insert is).
+        """
         with self._lock:
-            self.message_handlers[event_type] = handler
-            logger.info(f"Registered handler: {event_type}")
+            handlers = self.batch_handlers if batch else self.message_handlers
+            handlers.setdefault(event_type, []).append(handler)
+            logger.info(f"Registered {'batch ' if batch else ''}handler: {event_type}")
     
     def start(self):
         """Start consuming in background thread"""
@@ -62,52 +111,144 @@ class KafkaConsumerService:
                 logger.warning(f"Close error: {str(e)}")
         logger.info("Kafka Consumer stopped")
     
+    def _decode_batch(self, records: dict) -> dict:
+        """Decode a poll result into {event_type: [event, ...]}, dropping bad messages"""
+        by_type = {}
+        for messages in records.values():
+            for message in messages:
+                try:
+                    event = decode(message.value, (message.topic, message.partition, message.offset))
+                except InvalidEvent as e:
+                    self.invalid_messages += 1
+                    logger.warning("Rejected message %s:%d@%d: %s", message.topic, message.partition, message.offset, e)
+                    continue
+                
+                # Shared topics may carry event types another consumer owns
+                if self.event_types and event.event_type not in self.event_types:
+                    continue
+                by_type.setdefault(event.event_type, []).append(event)
+        return by_type
+    
+    def _drop_duplicates(self, by_type: dict) -> None:
+        """Remove already-persisted events before dispatch.
+
+        IDs the filter has never seen are new and pass without any lookup.
+        Filter hits (redeliveries, or rare false positives) are confirmed with
+        one batched lookup per table; only confirmed duplicates are dropped.
+        """
+        for event_type, events in list(by_type.items()):
+            cls = EVENT_TYPES.get(event_type)
+            if not cls:
+                continue
+            suspects = [e.event_id for e in events if e.event_id and self.seen_event_ids.might_contain(e.event_id)]
+            if not suspects:
+                continue
+            existing = existing_event_ids(cls.table, suspects)
+            if existing:
+                remaining = [e for e in events if e.event_id not in existing]
+                self.duplicate_messages += len(events) - len(remaining)
+                # A poll of nothing but redeliveries must still reach the commit
+                if remaining:
+                    by_type[event_type] = remaining
+                else:
+                    del by_type[event_type]
+                logger.info("Skipped %d redelivered %s events", len(existing), event_type)
+    
+    def _seed(self, partitions) -> None:
+        """Load IDs of events recently persisted from newly assigned partitions.
+
+        Messages past the last committed offset are redelivered after a
+        restart or rebalance; with their IDs already in the filter they are
+        confirmed and skipped instead of being written again.
+        """
+        event_types = self.event_types or list(EVENT_TYPES)
+        tables = sorted({EVENT_TYPES[t].table for t in event_types if t in EVENT_TYPES})
+        by_topic = {}
+        for tp in partitions:
+            by_topic.setdefault(tp.topic, []).append(tp.partition)
+
+        seeded = 0
+        try:
+            for topic, topic_partitions in by_topic.items():
+                for table in tables:
+                    for event_id in recent_event_ids(table, topic, topic_partitions, KAFKA_DEDUP_SEED_ROWS):
+                        self.seen_event_ids.add(event_id)
+                        seeded += 1
+        except Exception as e:
+            logger.warning("Could not seed duplicate filter: %s", e)
+            return
+        logger.info("Seeded duplicate filter with %d event IDs for %d partitions", seeded, len(partitions))
+    
+    def _remember(self, by_type: dict) -> None:
+        """Record IDs of events whose handlers completed"""
+        for events in by_type.values():
+            for event in events:
+                if event.event_id:
+                    self.seen_event_ids.add(event.event_id)
+    
+    def _run_batch(self, handler, event_type: str, events: list) -> None:
+        """Run a batch handler, bisecting around events it rejects as bad data"""
+        try:
+            handler(events)
+            return
+        except ROW_ERRORS as e:
+            if len(events) == 1:
+                self.invalid_messages += 1
+                logger.warning("Rejected %s event from %s: %s", event_type, events[0].source, str(e).strip())
+                return
+        middle = len(events) // 2
+        self._run_batch(handler, event_type, events[:middle])
+        self._run_batch(handler, event_type, events[middle:])
+    
+    def _dispatch(self, by_type: dict) -> None:
+        """Run registered handlers; transient batch handler failures propagate"""
+        for event_type, events in by_type.items():
+            if not events:
+                continue
+            for handler in self.batch_handlers.get(event_type, ()):
+                self._run_batch(handler, event_type, events)
+            for handler in self.message_handlers.get(event_type, ()):
+                for event in events:
+                    try:
+                        handler(event)
+                    except Exception as e:
+                        logger.warning("Handler error for %s: %s", event_type, e)
+            logger.debug("Dispatched %d %s events", len(events), event_type)
+    
+    def _rewind(self, records: dict) -> None:
+        """Seek back to the first offset of each partition in a failed poll"""
+        for tp, messages in records.items():
+            if messages:
+                self.consumer.seek(tp, messages[0].offset)
+    
     def _consume_loop(self):
-        """Main consume loop - persists events to database"""
+        """Main consume loop - decode, dispatch, then commit"""
         while self.is_running and self.consumer:
+            records = {}
             try:
-                for message in self.consumer:
-                    if not self.is_running:
-                        break
-                    
-                    try:
-                        value = message.value
-                        event_type = value.get('event_type', 'unknown')
-                        data = value.get('data', {})
-                        
-                        # Persist to database based on event type
-                        if event_type == 'http_request':
-                            insert_request(
-                                user_ip=data.get('user_ip'),
-                                method=data.get('method'),
-                                endpoint=data.get('endpoint'),
-                                hostname=data.get('hostname'),
-                                os=data.get('os')
-                            )
-                        elif event_type == 'http_response':
-                            insert_response(
-                                user_ip=data.get('user_ip'),
-                                status_code=data.get('status_code'),
-                                response_time_ms=data.get('response_time_ms', 0)
-                            )
-                        elif event_type == 'error':
-                            insert_error(
-                                error_message=data.get('error_message'),
-                                error_type=data.get('error_type'),
-                                endpoint=data.get('endpoint')
-                            )
-                        
-                        logger.debug(f"Persisted: {event_type} to database")
-                    except Exception as e:
-                        logger.warning(f"Error processing message: {str(e)}")
-                        
+                records = self.consumer.poll(timeout_ms=1000)
+                if not records:
+                    continue
+                
+                by_type = self._decode_batch(records)
+                self._drop_duplicates(by_type)
+                self._dispatch(by_type)
+                # Remember before committing: if the commit fails, this poll is
+                # redelivered and its already-written events must be recognised
+                self._remember(by_type)
+                # Offsets are committed only after handlers (DB writes) succeed
+                self.consumer.commit()
+            
             except Exception as e:
-                logger.warning(f"Consumer error: {str(e)}")
+                logger.warning("Consumer error: %s", e)
+                try:
+                    self._rewind(records)
+                except Exception as seek_error:
+                    logger.warning("Rewind failed: %s", seek_error)
                 if self.is_running:
-                    import time
                     time.sleep(2)
 
 
-def get_consumer(topics=None) -> KafkaConsumerService:
-    """Get consumer instance"""
-    return KafkaConsumerService(topics=topics)
+def get_consumer(topics=None, event_types=None) -> KafkaConsumerService:
+    """Get consumer instance for explicit topics or the topics routed for event_types"""
+    return KafkaConsumerService(topics=topics, event_types=event_types)
@@ -1,44 +1,145 @@
 """Simplified Kafka Producer"""
+import base64
 import json
 import logging
+import math
+import os
+import threading
+import time
 from datetime import datetime
 from kafka import KafkaProducer
-from kafka_config import KAFKA_BROKERS, KAFKA_TOPIC_EVENTS
+from kafka_config import (
+    KAFKA_BROKERS, KAFKA_PRODUCER_PROFILE, KAFKA_ADAPTIVE_INTERVAL_SECONDS,
+    KAFKA_ADAPTIVE_MAX_LINGER_MS, KAFKA_ADAPTIVE_MAX_BATCH_SIZE,
+    producer_settings, topic_for, key_for
+)
 
 logger = logging.getLogger(__name__)
 
+MIN_BATCH_SIZE = 16 * 1024
+
+
+def new_event_id() -> str:
+    """Compact, time-ordered unique ID: 48-bit millisecond timestamp + 80 random
+    bits, base32hex encoded (26 chars) so IDs sort by creation time."""
+    raw = (time.time_ns() // 1_000_000).to_bytes(6, 'big') + os.urandom(10)
+    return base64.b32hexencode(raw).decode('ascii').rstrip('=')
+
+
+class AdaptiveBatchTuner:
+    """Periodically re-tunes linger_ms and batch_size from the producer's own
+    metrics: observed send rate, average record size and broker request latency.
+
+    When fewer than one record arrives per broker round trip there is nothing
+    to batch, so linger drops to 0. Otherwise linger follows half the round
+    trip (capped) and batch_size is sized to hold what arrives in linger + RTT.
+    """
+
+    def __init__(self, producer: KafkaProducer, interval: float = KAFKA_ADAPTIVE_INTERVAL_SECONDS,
+                 max_linger_ms: int = KAFKA_ADAPTIVE_MAX_LINGER_MS,
+                 max_batch_size: int = KAFKA_ADAPTIVE_MAX_BATCH_SIZE):
+        self.producer = producer
+        self.interval = interval
+        self.max_linger_ms = max_linger_ms
+        self.max_batch_size = max_batch_size
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._unsupported = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._tune_loop, name='kafka-batch-tuner', daemon=True)
+        self._thread.start()
+        logger.info(f"Adaptive producer batching enabled (every {self.interval}s)")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def target(self, send_rate: float, record_size: float, rtt_ms: float) -> tuple:
+        """(linger_ms, batch_size) for the observed load"""
+        if send_rate * rtt_ms / 1000 < 1:
+            return 0, MIN_BATCH_SIZE
+        linger_ms = int(min(self.max_linger_ms, max(1, rtt_ms / 2)))
+        expected = send_rate * record_size * (linger_ms + rtt_ms) / 1000
+        batch_size = MIN_BATCH_SIZE
+        while batch_size < expected and batch_size < self.max_batch_size:
+            batch_size *= 2
+        return linger_ms, min(batch_size, self.max_batch_size)
+
+    def tune(self):
+        """Apply target settings to the live record accumulator"""
+        metrics = (self.producer.metrics() or {}).get('producer-metrics', {})
+        observed = [metrics.get(name) for name in ('record-send-rate', 'record-size-avg', 'request-latency-avg')]
+        if not all(isinstance(v, (int, float)) and math.isfinite(v) for v in observed):
+            return
+        linger_ms, batch_size = self.target(*observed)
+
+        # kafka-python (pinned in requirements.txt) reads these from the private
+        # accumulator config on every append/drain; there is no public setter
+        accumulator = getattr(self.producer, '_accumulator', None)
+        config = getattr(accumulator, 'config', None)
+        if not isinstance(config, dict):
+            if not self._unsupported:
+                self._unsupported = True
+                logger.warning("Adaptive batching unavailable: this kafka-python has no _accumulator.config; "
+                               "keeping linger_ms/batch_size from the profile")
+            return
+        if config.get('linger_ms') != linger_ms or config.get('batch_size') != batch_size:
+            config['linger_ms'] = linger_ms
+            config['batch_size'] = batch_size
+            logger.info(
+                "Producer re-tuned: linger_ms=%d batch_size=%d (%.0f rec/s, %.0f B/rec, rtt %.1f ms)",
+                linger_ms, batch_size, *observed
+            )
+
+    def _tune_loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.tune()
+            except Exception as e:
+                logger.warning("Producer tuning failed: %s", e)
+
 
 class KafkaProducerService:
     """Simple Kafka producer service"""
     
-    def __init__(self):
+    def __init__(self, profile: str = None):
         self.producer = None
+        self.profile = profile or KAFKA_PRODUCER_PROFILE
+        self.tuner = None
         try:
             self.producer = KafkaProducer(
                 bootstrap_servers=KAFKA_BROKERS,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8')
+                key_serializer=lambda k: k.encode('utf-8') if k is not None else None,
+                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                **producer_settings(self.profile)
             )
-            logger.info("Kafka Producer initialized")
+            if self.profile == 'adaptive':
+                self.tuner = AdaptiveBatchTuner(self.producer)
+                self.tuner.start()
+            logger.info(f"Kafka Producer initialized (profile: {self.profile})")
         except Exception as e:
             logger.warning(f"Kafka Producer init failed: {str(e)}")
             self.producer = None
     
     def send_event(self, event_type: str, data: dict, topic: str = None) -> bool:
-        """Send an event to Kafka"""
+        """Send an event to Kafka, routed by event type and keyed for partition affinity"""
         if not self.producer:
             return False
         
         try:
-            topic = topic or KAFKA_TOPIC_EVENTS
+            topic = topic or topic_for(event_type)
             message = {
+                'event_id': new_event_id(),
                 'timestamp': datetime.utcnow().isoformat() + 'Z',
                 'event_type': event_type,
                 'data': data
             }
-            self.producer.send(topic, value=message)
+            self.producer.send(topic, key=key_for(event_type, data), value=message)
             return True
         except Exception as e:
-            logger.warning(f"Failed to send event: {str(e)}")
+            logger.warning("Failed to send event: %s", e)
             return False
     
     def send_request_event(self, user_ip: str, method: str, endpoint: str, **extra) -> bool:
@@ -77,6 +178,8 @@ class KafkaProducerService:
     
     def close(self) -> None:
         """Close the producer"""
+        if self.tuner:
+            self.tuner.stop()
         if self.producer:
             try:
                 self.producer.close()
@@ -84,6 +187,6 @@ class KafkaProducerService:
                 logger.warning(f"Close error: {str(e)}")
 
 
-def get_producer() -> KafkaProducerService:
+def get_producer(profile: str = None) -> KafkaProducerService:
     """Get producer instance"""
-    return KafkaProducerService()
+    return KafkaProducerService(profile=profile)
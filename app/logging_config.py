@@ -0,0 +1,199 @@
+"""Asynchronous structured logging configuration"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Logging configuration from environment variables
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_WINDOW_SECONDS = float(os.getenv('LOG_SAMPLE_WINDOW_SECONDS', '10'))
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', '20'))
+LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', '100'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes present on every LogRecord; anything else came in via `extra=`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[QueueListener] = None
+_queue: Optional[queue.Queue] = None
+_queue_handler: Optional[QueueHandler] = None
+_dropped_counter = None
+_suppressed_counter = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON documents for Fluent Bit"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat().replace('+00:00', 'Z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                document[key] = value
+        if record.exc_info:
+            document['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            document['exc_info'] = record.exc_text
+        return json.dumps(document, default=str)
+
+
+class RepeatSamplingFilter(logging.Filter):
+    """Pass the first LOG_SAMPLE_BURST records of each message template per
+    window, then only every LOG_SAMPLE_RATE-th one. Records at ERROR and above
+    are never sampled. The number of records suppressed since the last one that
+    got through is attached to it as `suppressed`.
+    """
+
+    def __init__(self, window_seconds: float, burst: int, rate: int, max_keys: int = 4096):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+
+        key = (record.name, record.levelno, record.msg)
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                if len(self._state) >= self.max_keys:
+                    self._state.clear()
+                # [window_start, seen_in_window, suppressed_since_last_pass]
+                state = self._state[key] = [record.created, 0, 0]
+            elif record.created - state[0] >= self.window_seconds:
+                state[0] = record.created
+                state[1] = 0
+
+            state[1] += 1
+            seen = state[1]
+            if seen > self.burst and (self.rate <= 0 or (seen - self.burst) % self.rate):
+                state[2] += 1
+                suppressed = None
+            else:
+                suppressed = state[2]
+                state[2] = 0
+
+        if suppressed is None:
+            if _suppressed_counter:
+                _suppressed_counter.labels(logger=record.name).inc()
+            return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is
+    full, and defers all message formatting to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record does not need to be
+        # made picklable; formatting happens in the listener thread instead.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if _dropped_counter:
+                _dropped_counter.inc()
+
+
+def _init_metrics(log_queue: queue.Queue) -> None:
+    """Register logging pipeline metrics with graceful degradation"""
+    global _dropped_counter, _suppressed_counter
+    try:
+        from prometheus_client import Counter, Gauge
+
+        depth = Gauge('log_queue_depth', 'Log records waiting to be written')
+        depth.set_function(log_queue.qsize)
+        _dropped_counter = Counter(
+            'log_records_dropped_total',
+            'Log records dropped because the logging queue was full'
+        )
+        _suppressed_counter = Counter(
+            'log_records_suppressed_total',
+            'Repeated log records suppressed by sampling',
+            ['logger']
+        )
+    except Exception as e:
+        logging.getLogger(__name__).warning("Logging metrics initialization failed: %s", e)
+
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a bounded queue drained by a background thread"""
+    global _listener, _queue, _queue_handler
+    if _listener:
+        return _listener
+
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = _queue_handler = NonBlockingQueueHandler(_queue)
+    queue_handler.addFilter(RepeatSamplingFilter(
+        window_seconds=LOG_SAMPLE_WINDOW_SECONDS,
+        burst=LOG_SAMPLE_BURST,
+        rate=LOG_SAMPLE_RATE
+    ))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _init_metrics(_queue)
+
+    _listener = QueueListener(_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background writer.
+
+    The root logger is switched back to writing synchronously first, so
+    records logged after this point (late shutdown, atexit) are not lost.
+    """
+    global _listener, _queue_handler
+    if not _listener:
+        return
+
+    root = logging.getLogger()
+    if _queue_handler:
+        root.removeHandler(_queue_handler)
+        _queue_handler = None
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+
+    try:
+        _listener.stop()
+    except Exception:
+        pass
+    _listener = None
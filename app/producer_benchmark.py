@@ -0,0 +1,150 @@
+"""Kafka producer throughput benchmark across throughput profiles
+
+Usage (against a local single-node broker standing in for the cluster):
+    docker run -d --name kafka -p 9092:9092 apache/kafka:3.8.0
+    KAFKA_BROKERS=localhost:9092 python producer_benchmark.py --messages 200000
+
+For each profile the benchmark sends a warm-up batch (which also gives the
+adaptive tuner data to work with), then times `--messages` representative
+http_request events and reports msgs/sec, payload and on-the-wire bytes,
+and send-to-ack latency percentiles.
+
+Payload is the serialized keys and values. Wire is measured, not estimated:
+bytes the producer wrote to broker sockets during the timed run (produce
+requests with their record batches and framing, plus any metadata requests),
+counted by a total attached to kafka-python's `bytes-sent` sensor. The
+ratio is wire / payload, so it includes protocol overhead as well as
+compression.
+"""
+import argparse
+import json
+import logging
+import time
+from datetime import datetime
+
+from kafka.metrics.stats import Total
+
+from kafka_config import PRODUCER_PROFILES, key_for
+from kafka_producer import KafkaProducerService, new_event_id
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _event(i: int) -> tuple:
+    """A representative http_request event (key, message)"""
+    data = {
+        'user_ip': f"10.0.{(i >> 8) & 255}.{i & 255}",
+        'method': 'GET',
+        'endpoint': '/',
+        'hostname': 'simple-time-service-7d9f8b6c5-x2x4p',
+        'os': 'Linux',
+    }
+    message = {
+        'event_id': new_event_id(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'event_type': 'http_request',
+        'data': data
+    }
+    return key_for('http_request', data), message
+
+
+def _count_bytes_sent(producer):
+    """Attach an all-time total to the producer's `bytes-sent` sensor, the
+    parent of every broker connection's sensor; None if it is unavailable"""
+    metrics = getattr(producer, '_metrics', None)
+    sensor = metrics.get_sensor('bytes-sent') if metrics else None
+    if sensor is None:
+        return None
+    total = Total()
+    sensor.add(metrics.metric_name(
+        'benchmark-bytes-sent-total', 'producer-metrics',
+        'Bytes written to broker sockets since the timed run started'
+    ), total)
+    return total
+
+
+def run_profile(profile: str, topic: str, messages: int, warmup: int) -> dict:
+    """Benchmark one profile; returns its result row"""
+    service = KafkaProducerService(profile=profile)
+    producer = service.producer
+    if not producer:
+        raise RuntimeError("Kafka producer unavailable - is the broker running?")
+
+    latencies = []
+    counters = {'payload_bytes': 0, 'errors': 0}
+
+    def on_ack(sent_at, metadata):
+        latencies.append(time.perf_counter() - sent_at)
+        counters['payload_bytes'] += metadata.serialized_value_size + max(metadata.serialized_key_size, 0)
+
+    def on_error(exc):
+        counters['errors'] += 1
+
+    try:
+        for i in range(warmup):
+            key, message = _event(i)
+            producer.send(topic, key=key, value=message)
+        producer.flush()
+        if service.tuner:
+            service.tuner.tune()
+
+        events = [_event(i) for i in range(messages)]
+        bytes_sent = _count_bytes_sent(producer)
+        started = time.perf_counter()
+        for key, message in events:
+            sent_at = time.perf_counter()
+            future = producer.send(topic, key=key, value=message)
+            future.add_callback(on_ack, sent_at)
+            future.add_errback(on_error)
+        producer.flush()
+        elapsed = time.perf_counter() - started
+        wire_bytes = bytes_sent.measure(None, None) if bytes_sent else float('nan')
+    finally:
+        service.close()
+
+    latencies.sort()
+    return {
+        'profile': profile,
+        'msgs_per_sec': messages / elapsed if elapsed else 0,
+        'payload_mb': counters['payload_bytes'] / 1e6,
+        'wire_mb': wire_bytes / 1e6,
+        'wire_ratio': wire_bytes / counters['payload_bytes'] if counters['payload_bytes'] else float('nan'),
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'errors': counters['errors'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Kafka producer throughput profiles")
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PRODUCER_PROFILES), default=sorted(PRODUCER_PROFILES))
+    parser.add_argument('--topic', default='simple-time-service-benchmark')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--warmup', type=int, default=10000)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    results = [run_profile(profile, args.topic, args.messages, args.warmup) for profile in args.profiles]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'profile':<16}{'msgs/s':>12}{'payload MB':>12}{'wire MB':>10}{'ratio':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f"{r['profile']:<16}{r['msgs_per_sec']:>12.0f}{r['payload_mb']:>12.2f}{r['wire_mb']:>10.2f}"
+            f"{r['wire_ratio']:>8.2f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
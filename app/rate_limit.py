@@ -0,0 +1,149 @@
+"""Per-client token-bucket rate limiting with bounded memory"""
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rate limit configuration from environment variables
+# RATE_LIMITS: comma separated "route=rate:burst", rate in requests/second per client IP
+RATE_LIMITS = os.getenv('RATE_LIMITS', '/=20:40,/kafka/publish=5:10')
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '100000'))
+RATE_LIMIT_SHARDS = int(os.getenv('RATE_LIMIT_SHARDS', '16'))
+# Proxies in front of the app that append to X-Forwarded-For (the ALB). The
+# client is the entry the outermost trusted proxy appended; anything left of
+# it is client-supplied and must not be used as the key. 0 = socket peer.
+RATE_LIMIT_TRUSTED_HOPS = int(os.getenv('RATE_LIMIT_TRUSTED_HOPS', '1'))
+
+_limiters: Optional[Dict[str, 'TokenBucketLimiter']] = None
+_throttled_requests = None
+_throttled_clients = None
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by client, held in a fixed number of LRU shards.
+
+    Each shard keeps at most max_clients / shards buckets and evicts the
+    least recently seen client when full, so memory is bounded no matter how
+    many distinct IPs show up. Active (and therefore noisy) clients stay hot
+    in the LRU; an evicted client simply starts again with a full bucket.
+    """
+
+    def __init__(self, route: str, rate: float, burst: int,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS, shards: int = RATE_LIMIT_SHARDS):
+        self.route = route
+        self.rate = rate
+        self.burst = burst
+        self.shard_capacity = max(1, max_clients // shards)
+        # bucket: [tokens, last_refill, throttled]
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def tracked_clients(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def acquire(self, client: str) -> float:
+        """Take a token for `client`; returns 0 if allowed, else seconds until the next token"""
+        index = zlib.crc32(client.encode()) % len(self._shards)
+        shard = self._shards[index]
+        now = time.monotonic()
+
+        with self._locks[index]:
+            bucket = shard.get(client)
+            if bucket is None:
+                if len(shard) >= self.shard_capacity:
+                    shard.popitem(last=False)
+                bucket = shard[client] = [float(self.burst), now, False]
+            else:
+                shard.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = False
+                return 0.0
+
+            newly_throttled = not bucket[2]
+            bucket[2] = True
+            wait = (1 - bucket[0]) / self.rate if self.rate > 0 else 1.0
+
+        if _throttled_requests:
+            _throttled_requests.labels(endpoint=self.route).inc()
+        if newly_throttled and _throttled_clients:
+            _throttled_clients.labels(endpoint=self.route).inc()
+        return wait
+
+
+def client_key(forwarded_for: List[str], peer: Optional[str], trusted_hops: int = RATE_LIMIT_TRUSTED_HOPS) -> str:
+    """Rate limit key: the address the outermost trusted proxy saw, not the
+    client-controlled leftmost X-Forwarded-For entry"""
+    if trusted_hops > 0:
+        hops = [ip.strip() for header in forwarded_for for ip in header.split(',') if ip.strip()]
+        if len(hops) >= trusted_hops:
+            return hops[-trusted_hops]
+    return peer or "unknown"
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, int]]:
+    """Parse "route=rate:burst,..." into {route: (rate, burst)}"""
+    limits = {}
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            route, value = entry.rsplit('=', 1)
+            rate, _, burst = value.partition(':')
+            rate = float(rate)
+            limits[route.strip()] = (rate, int(burst) if burst else max(1, int(rate)))
+        except ValueError:
+            logger.warning("Ignoring invalid rate limit entry: %s", entry)
+    return limits
+
+
+def _init_metrics(limiters: Dict[str, TokenBucketLimiter]) -> None:
+    """Register rate limiting metrics with graceful degradation"""
+    global _throttled_requests, _throttled_clients
+    try:
+        from prometheus_client import Counter, Gauge
+
+        _throttled_requests = Counter(
+            'rate_limited_requests_total',
+            'Requests rejected with 429 by the per-client rate limiter',
+            ['endpoint']
+        )
+        _throttled_clients = Counter(
+            'rate_limited_clients_total',
+            'Times a client went from allowed to throttled',
+            ['endpoint']
+        )
+        tracked = Gauge(
+            'rate_limiter_tracked_clients',
+            'Client buckets currently held by the rate limiter',
+            ['endpoint']
+        )
+        for route, limiter in limiters.items():
+            tracked.labels(endpoint=route).set_function(limiter.tracked_clients)
+    except Exception as e:
+        logger.warning(f"Rate limit metrics initialization failed: {str(e)}")
+
+
+def get_rate_limiters(spec: str = RATE_LIMITS) -> Dict[str, TokenBucketLimiter]:
+    """Build one limiter per configured route (once per process; `python app.py`
+    imports the app module twice and both copies must share these)"""
+    global _limiters
+    if _limiters is not None:
+        return _limiters
+    limiters = _limiters = {
+        route: TokenBucketLimiter(route, rate, burst)
+        for route, (rate, burst) in parse_rate_limits(spec).items()
+    }
+    _init_metrics(limiters)
+    for route, limiter in limiters.items():
+        logger.info(f"Rate limit {route}: {limiter.rate}/s, burst {limiter.burst}")
+    return limiters
@@ -0,0 +1,211 @@
+"""Replay/backfill a range of an events topic into PostgreSQL
+
+Usage:
+    python replay.py --topic simple-time-service-events --partitions 0 1 \
+        --start-time 2026-01-01T00:00:00 --end-time 2026-01-02T00:00:00
+
+Partitions are read with manual assignment (no consumer group, no
+rebalances, no committed offsets) and each one is replayed by its own worker
+process, which decodes messages and writes them in bulk. Rows carry their
+(topic, partition, offset) and conflicting rows are skipped, so replaying a
+range that was already ingested - by the live consumer or an earlier
+replay - is safe. Rows the database rejects (out-of-range values and the
+like) are isolated and counted as invalid; the rest of the batch is kept.
+
+Rows written before the source_* columns were added have them NULL, and NULLs
+never conflict, so replaying offsets that were ingested before that migration
+inserts a second copy of those events. Start replays after the migration,
+or deduplicate afterwards.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from kafka import KafkaConsumer, TopicPartition
+from kafka_config import KAFKA_BROKERS, KAFKA_TOPIC_EVENTS
+from database import bulk_insert_isolating, close_pool
+from events import EVENT_TYPES, InvalidEvent, decode
+
+logger = logging.getLogger(__name__)
+
+# Replay configuration from environment variables
+REPLAY_BATCH_SIZE = int(os.getenv('REPLAY_BATCH_SIZE', '5000'))
+REPLAY_PROGRESS_SECONDS = float(os.getenv('REPLAY_PROGRESS_SECONDS', '5'))
+REPLAY_FETCH_BYTES = int(os.getenv('REPLAY_FETCH_BYTES', str(16 * 1024 * 1024)))
+
+def _offset_range(consumer: KafkaConsumer, tp: TopicPartition,
+                  start_offset: Optional[int], end_offset: Optional[int],
+                  start_ms: Optional[int], end_ms: Optional[int]) -> Tuple[int, int]:
+    """Resolve the [start, end) offsets to replay for one partition"""
+    beginning = consumer.beginning_offsets([tp])[tp]
+    high_watermark = consumer.end_offsets([tp])[tp]
+
+    start = beginning
+    if start_offset is not None:
+        start = max(start_offset, beginning)
+    elif start_ms is not None:
+        found = consumer.offsets_for_times({tp: start_ms})[tp]
+        start = found.offset if found else high_watermark
+
+    end = high_watermark
+    if end_offset is not None:
+        end = min(end_offset, high_watermark)
+    elif end_ms is not None:
+        found = consumer.offsets_for_times({tp: end_ms})[tp]
+        end = found.offset if found else high_watermark
+    return start, end
+
+
+def replay_partition(topic: str, partition: int,
+                     start_offset: Optional[int] = None, end_offset: Optional[int] = None,
+                     start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                     batch_size: int = REPLAY_BATCH_SIZE) -> dict:
+    """Replay one partition; returns counters for the summary"""
+    tp = TopicPartition(topic, partition)
+    consumer = KafkaConsumer(
+        bootstrap_servers=KAFKA_BROKERS,
+        group_id=None,
+        enable_auto_commit=False,
+        max_poll_records=batch_size,
+        fetch_max_bytes=REPLAY_FETCH_BYTES,
+        max_partition_fetch_bytes=REPLAY_FETCH_BYTES
+    )
+    stats = {'partition': partition, 'read': 0, 'inserted': 0, 'skipped': 0, 'invalid': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    try:
+        consumer.assign([tp])
+        start, end = _offset_range(consumer, tp, start_offset, end_offset, start_ms, end_ms)
+        stats['start'], stats['end'] = start, end
+        if start >= end:
+            return stats
+        consumer.seek(tp, start)
+
+        total = end - start
+        position = start
+        last_report = started
+        while position < end:
+            records = consumer.poll(timeout_ms=1000, max_records=batch_size).get(tp, [])
+            if not records:
+                # Trailing offsets may be control records or compacted away
+                if consumer.position(tp) >= end:
+                    break
+                continue
+
+            rows_by_table = {}
+            for record in records:
+                if record.offset >= end:
+                    position = end
+                    break
+                position = record.offset + 1
+                stats['read'] += 1
+                try:
+                    event = decode(record.value, (topic, partition, record.offset))
+                except InvalidEvent:
+                    stats['invalid'] += 1
+                    continue
+                if event.event_type in EVENT_TYPES:
+                    rows_by_table.setdefault(event.table, []).append(event.row())
+
+            for table, rows in rows_by_table.items():
+                inserted, rejected = bulk_insert_isolating(table, rows)
+                stats['inserted'] += inserted
+                stats['invalid'] += len(rejected)
+                stats['skipped'] += len(rows) - inserted - len(rejected)
+
+            now = time.perf_counter()
+            if now - last_report >= REPLAY_PROGRESS_SECONDS:
+                done = position - start
+                logger.info(
+                    "Partition %d: %d/%d (%.1f%%), %.0f msg/s",
+                    partition, done, total, 100.0 * done / total, done / (now - started)
+                )
+                last_report = now
+    finally:
+        stats['seconds'] = time.perf_counter() - started
+        consumer.close()
+        close_pool()
+    return stats
+
+
+def list_partitions(topic: str) -> List[int]:
+    """All partitions of `topic`"""
+    consumer = KafkaConsumer(bootstrap_servers=KAFKA_BROKERS, group_id=None, enable_auto_commit=False)
+    try:
+        partitions = consumer.partitions_for_topic(topic)
+        if not partitions:
+            raise ValueError(f"Topic not found: {topic}")
+        return sorted(partitions)
+    finally:
+        consumer.close()
+
+
+def _to_ms(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay an events topic range into PostgreSQL")
+    parser.add_argument('--topic', default=KAFKA_TOPIC_EVENTS)
+    parser.add_argument('--partitions', type=int, nargs='+', help="Default: all partitions")
+    parser.add_argument('--start-offset', type=int)
+    parser.add_argument('--end-offset', type=int, help="Exclusive (default: high watermark at start)")
+    parser.add_argument('--start-time', type=datetime.fromisoformat, help="UTC unless an offset is given")
+    parser.add_argument('--end-time', type=datetime.fromisoformat, help="Exclusive, UTC unless an offset is given")
+    parser.add_argument('--batch-size', type=int, default=REPLAY_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, help="Default: one per partition")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    partitions = args.partitions or list_partitions(args.topic)
+    workers = args.workers or len(partitions)
+    logger.info("Replaying %s partitions %s with %d workers", args.topic, partitions, workers)
+
+    started = time.perf_counter()
+    totals = {'read': 0, 'inserted': 0, 'skipped': 0, 'invalid': 0}
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                replay_partition, args.topic, partition,
+                args.start_offset, args.end_offset,
+                _to_ms(args.start_time), _to_ms(args.end_time),
+                args.batch_size
+            ): partition
+            for partition in partitions
+        }
+        for future in as_completed(futures):
+            partition = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                failed.append(partition)
+                logger.error("Partition %d failed: %s", partition, e)
+                continue
+            for key in totals:
+                totals[key] += stats[key]
+            logger.info(
+                "Partition %d done: offsets [%s, %s), read %d, inserted %d, skipped %d, invalid %d in %.1fs",
+                partition, stats.get('start'), stats.get('end'), stats['read'], stats['inserted'],
+                stats['skipped'], stats['invalid'], stats['seconds']
+            )
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Replay complete: read %d, inserted %d, skipped %d (already present), invalid %d in %.1fs (%.0f msg/s)",
+        totals['read'], totals['inserted'], totals['skipped'], totals['invalid'],
+        elapsed, totals['read'] / elapsed if elapsed else 0
+    )
+    if failed:
+        raise SystemExit(f"Failed partitions: {sorted(failed)}")
+
+
+if __name__ == '__main__':
+    main()